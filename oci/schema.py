@@ -2,51 +2,156 @@
 This module provides storage modules for Broadworks OCI Schema types.
 """
 import sqlite3
-import json
 import os
 import logging
+import functools
+import re
+import orjson
+import zstandard
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def walk_parameters(parameters):
+    """
+    Walks through parameters to build an example, using an explicit stack
+    rather than recursion so deeply nested types cannot hit the recursion limit.
+    Args:
+        parameters: A list of parameter dictionaries.
+    Returns:
+        A dictionary representing the example structure.
+    """
+    example = {}
+    stack = [(example, parameters)]
+    while stack:
+        parent, params = stack.pop()
+        for param in params:
+            if "$ref" in param:
+                continue  # circular reference back to an enclosing type
+            if "children" in param:
+                child = {}
+                parent[param["name"]] = child
+                stack.append((child, param["children"]))
+            elif param.get("minOccurs") == 0:
+                parent[param["name"]] = None
+            else:
+                parent[param["name"]] = ""
+    return example
+
+def _regexp(pattern, value):
+    """
+    Implements the SQL REGEXP operator as a case-insensitive re.search.
+    Args:
+        pattern: The regular expression (right hand side of REGEXP).
+        value: The column value being tested.
+    Returns:
+        True if the pattern matches anywhere in the value.
+    """
+    return value is not None and re.search(pattern, value, re.IGNORECASE) is not None
+
 class SQLiteOCITypeStore:
     """
     Provides an interface for storing and retrieving Broadworks OCI types in a SQLite database.
+
+    Lookups by type name are cached per instance; the returned parameters and
+    examples are shared between calls and should not be modified.
     """
+    cache_size = 1024
+
     def __init__(self, db_path=None):
         if db_path is None:
             db_path = os.path.join(os.path.dirname(__file__), "oci_schema.db")
         self.conn = sqlite3.connect(db_path)
+        self.conn.create_function("REGEXP", 2, _regexp, deterministic=True)
         self.cur = self.conn.cursor()
+        # raw schemas are zstd-compressed, against a stored dictionary if there is one
+        row = self.cur.execute("SELECT dictionary FROM oci_raw_schema_dict").fetchone()
+        self._decompressor = zstandard.ZstdDecompressor(
+            dict_data=zstandard.ZstdCompressionDict(row[0]) if row else None
+        )
+        self._cached_fetch = functools.lru_cache(maxsize=self.cache_size)(self._fetch)
+        # types() SQL by which filters are present; sqlite3 reuses the prepared
+        # statement for identical SQL text
+        self._types_queries = {}
 
     def close(self):
         """
-        Closes the database connection.
+        Closes the database connection and drops any cached lookups.
         """
+        self._cached_fetch.cache_clear()
         self.conn.close()
 
-    def types(self, kind=None, filter=None):
+    def _fetch(self, query, name, decode=None):
+        """
+        Retrieves a single value for a given OCI type; cached per instance as _cached_fetch.
+        Args:
+            query: A SELECT returning one column, with the type name as its only parameter.
+            name: The name of the OCI type.
+            decode: An optional function applied to the value before it is cached.
+        Returns:
+            The (decoded) value, or None if not found.
+        """
+        self.cur.execute(query, (name,))
+        row = self.cur.fetchone()
+        if row is None:
+            return None
+        return decode(row[0]) if decode else row[0]
+
+    def _decompress_schema(self, data):
+        """
+        Decompresses a raw schema value read from oci_raw_schema.
+        Args:
+            data: The zstd-compressed XML.
+        Returns:
+            The XML schema string.
+        """
+        return self._decompressor.decompress(data).decode()
+
+    def types(self, kind=None, filter=None, regex=None):
         """
         Retrieves a list of OCI types from the database, optionally filtered by kind and name.
         Args:
             kind: The kind of OCI type to filter by (e.g., complexType, simpleType).
             filter: A string to filter the type names.
+            regex: A regular expression the type names must match (case-insensitive).
         Returns:
             A list of type names that match the criteria.
+        Raises:
+            re.error: If regex is not a valid regular expression.
         """
-        query = "SELECT name FROM oci_types"
-        conditions = []
+        if regex:
+            # fail here with a clear error rather than from inside SQLite, and
+            # even when no rows would reach the REGEXP function
+            re.compile(regex, re.IGNORECASE)
+        if regex and not filter and re.escape(regex) == regex:
+            # plain text needs no regex engine; LIKE avoids a Python call per row
+            filter, regex = regex, None
+
+        key = (bool(kind), bool(filter), bool(regex))
+        query = self._types_queries.get(key)
+        if query is None:
+            query = "SELECT name FROM oci_types"
+            conditions = []
+            if kind:
+                conditions.append("kind = ?")
+            if filter:
+                conditions.append("name LIKE ? ESCAPE '\\'")
+            if regex:
+                conditions.append("name REGEXP ?")
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY name"
+            self._types_queries[key] = query
+
         params = []
         if kind:
-            conditions.append("kind = ?")
             params.append(kind)
         if filter:
-            conditions.append("name LIKE ?")
-            params.append(f"%{filter}%")
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-
-        query += " ORDER BY name"
+            # match the filter text literally, not as LIKE wildcards
+            escaped = filter.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if regex:
+            params.append(regex)
         logger.debug("Executing query: %s with params: %s", query, params)
         return [r[0] for r in self.cur.execute(query, params)]
 
@@ -58,9 +163,7 @@ class SQLiteOCITypeStore:
         Returns:
             The documentation string for the type, or None if not found.
         """
-        self.cur.execute("SELECT documentation FROM oci_docs WHERE name = ?", (name,))
-        row = self.cur.fetchone()
-        return row[0] if row else None
+        return self._cached_fetch("SELECT documentation FROM oci_docs WHERE name = ?", name)
 
     def parameters(self, name):
         """
@@ -70,9 +173,9 @@ class SQLiteOCITypeStore:
         Returns:
             A list of parameters as dictionaries, or None if not found.
         """
-        self.cur.execute("SELECT parameters FROM oci_parameters WHERE name = ?", (name,))
-        row = self.cur.fetchone()
-        return json.loads(row[0]) if row else None
+        return self._cached_fetch(
+            "SELECT parameters FROM oci_parameters WHERE name = ?", name, orjson.loads
+        )
 
     def schema(self, name):
         """
@@ -82,9 +185,9 @@ class SQLiteOCITypeStore:
         Returns:
             The XML schema string for the type, or None if not found.
         """
-        self.cur.execute("SELECT xml FROM oci_raw_schema WHERE name = ?", (name,))
-        row = self.cur.fetchone()
-        return row[0] if row else None
+        return self._cached_fetch(
+            "SELECT xml FROM oci_raw_schema WHERE name = ?", name, self._decompress_schema
+        )
 
     def example(self, name):
         """
@@ -99,24 +202,39 @@ class SQLiteOCITypeStore:
             - This works in python, but did not work in perl
           - We may work around this by reordering the parameters on request
         """
-        logger.debug("Generating example for type: %s", name)
-        parameters = self.parameters(name)
-        def walk_parameters(parameters):
-            """
-            Recursively walks through parameters to build an example.
-            Args:
-                parameters: A list of parameter dictionaries.
-            Returns:
-                A dictionary representing the example structure.
+        return self._cached_fetch(
+            "SELECT example FROM oci_examples WHERE name = ?", name, orjson.loads
+        )
+
+    def get_all(self, name):
+        """
+        Retrieves the documentation, schema, parameters and example for a given
+        OCI type in a single query.
+        Args:
+            name: The name of the OCI type.
+        Returns:
+            A tuple of (documentation, schema, parameters, example); each item is
+            None if not found, as returned by doc(), schema(), parameters() and example().
+        """
+        self.cur.execute(
             """
-            example = {}
-            for param in parameters:
-                if "children" in param:
-                    example[param["name"]] = walk_parameters(param["children"])
-                else:
-                    if 'minOccurs' in param and param['minOccurs'] == 0:
-                        example[param["name"]] = None
-                    else:
-                        example[param["name"]] = ""
-            return example
-        return walk_parameters(parameters)
\ No newline at end of file
+            SELECT d.documentation, r.xml, p.parameters, e.example
+            FROM oci_types t
+            LEFT JOIN oci_docs d USING (name)
+            LEFT JOIN oci_raw_schema r USING (name)
+            LEFT JOIN oci_parameters p USING (name)
+            LEFT JOIN oci_examples e USING (name)
+            WHERE t.name = ?
+            """,
+            (name,),
+        )
+        row = self.cur.fetchone()
+        if row is None:
+            return None, None, None, None
+        doc, schema, parameters, example = row
+        return (
+            doc,
+            self._decompress_schema(schema) if schema is not None else None,
+            orjson.loads(parameters) if parameters is not None else None,
+            orjson.loads(example) if example is not None else None,
+        )
@@ -3,13 +3,97 @@ Broadworks OCI XSD Parser
 This script parses the Broadworks OCI XSD schema and generates JSON representations
 """
 
-import json
-import xml.etree.ElementTree as ET
+import logging
+import os
 import sqlite3
-from xmlschema import XMLSchema
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import orjson
+import zstandard
 from lxml import etree
+from oci.schema import walk_parameters
 
-schema = XMLSchema("Rel_2024_10_260_OCISchemaAS/OCISchemaAS.xsd")
+logger = logging.getLogger(__name__)
+
+XS = "{http://www.w3.org/2001/XMLSchema}"
+MODEL_GROUP_TAGS = (XS + "sequence", XS + "choice", XS + "all")
+# tags compared on every node while building type trees
+XS_ANNOTATION = XS + "annotation"
+XS_COMPLEX_CONTENT = XS + "complexContent"
+XS_COMPLEX_TYPE = XS + "complexType"
+XS_ELEMENT = XS + "element"
+XS_EXTENSION = XS + "extension"
+XS_SIMPLE_CONTENT = XS + "simpleContent"
+XS_SIMPLE_TYPE = XS + "simpleType"
+
+# raw schema snippets are stored zstd-compressed with a dictionary trained on them
+RAW_SCHEMA_DICT_SIZE = 112640
+RAW_SCHEMA_LEVEL = 10
+
+# (targetNamespace, elementFormDefault is qualified) for each parsed schema document
+_schema_roots: dict[etree._Element, tuple[str | None, bool]] = {}
+# global xs:element declarations by qualified name, to resolve ref= particles
+_global_elements: dict[str, etree._Element] = {}
+
+
+def load_schema(path):
+    """
+    Parses an XSD file with lxml, following its xs:include, xs:import and
+    xs:redefine schema locations.
+    Args:
+        path: The path to the top level XSD file.
+    Returns:
+        A tuple of (types, type_index). types maps the name of each global type
+        in the top level target namespace to its element; type_index maps the
+        qualified name of every global type to its element, to resolve references.
+    """
+    types = {}
+    all_types = {}
+    top_ns = None
+    pending = [(os.path.abspath(path), None)]
+    loaded = set()
+    while pending:
+        file_path, including_ns = pending.pop(0)
+        if file_path in loaded:
+            continue
+        root = etree.parse(file_path).getroot()
+        # included schemas without a targetNamespace take the including one
+        tns = root.get("targetNamespace", including_ns)
+        if not loaded:
+            top_ns = tns
+        loaded.add(file_path)
+        _schema_roots[root] = (tns, root.get("elementFormDefault") == "qualified")
+
+        for ref in root.iterchildren(XS + "include", XS + "import", XS + "redefine"):
+            location = ref.get("schemaLocation")
+            if location:
+                ref_path = os.path.normpath(
+                    os.path.join(os.path.dirname(file_path), location)
+                )
+                pending.append((ref_path, None if ref.tag == XS + "import" else tns))
+        for elem in root.iterchildren(XS + "element"):
+            name = elem.get("name")
+            _global_elements[f"{{{tns}}}{name}" if tns else name] = elem
+        for elem in root.iterchildren(XS + "complexType", XS + "simpleType"):
+            name = elem.get("name")
+            all_types[f"{{{tns}}}{name}" if tns else name] = elem
+            if tns == top_ns:
+                types[name] = elem
+    return types, all_types
+
+
+schema_types, type_index = load_schema("Rel_2024_10_260_OCISchemaAS/OCISchemaAS.xsd")
+
+# documentation and serialized schema per type element; build_type_tree
+# revisits shared types many times, so each is computed once
+_doc_cache: dict[etree._Element, str | None] = {}
+_raw_cache: dict[etree._Element, str | None] = {}
+
+# finished type trees keyed by type element
+_tree_cache: dict[etree._Element, dict] = {}
+
+# content particles of extension base types (OCIRequest, SearchCriteria, ...)
+_base_particles: dict[etree._Element, list] = {}
 
 
 def initialize_db(db_path="oci_schema.db"):
@@ -22,162 +106,450 @@ def initialize_db(db_path="oci_schema.db"):
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
     cur.executescript("""
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
     CREATE TABLE IF NOT EXISTS oci_types (
         name TEXT PRIMARY KEY,
         kind TEXT
     );
+    CREATE INDEX IF NOT EXISTS idx_oci_types_kind_name ON oci_types(kind, name);
     CREATE TABLE IF NOT EXISTS oci_docs (
         name TEXT PRIMARY KEY REFERENCES oci_types(name),
         documentation TEXT
     );
     CREATE TABLE IF NOT EXISTS oci_raw_schema (
         name TEXT PRIMARY KEY REFERENCES oci_types(name),
-        xml TEXT
+        xml BLOB
+    );
+    CREATE TABLE IF NOT EXISTS oci_raw_schema_dict (
+        dictionary BLOB
     );
     CREATE TABLE IF NOT EXISTS oci_parameters (
         name TEXT PRIMARY KEY REFERENCES oci_types(name),
-        parameters TEXT
+        parameters BLOB
+    );
+    CREATE TABLE IF NOT EXISTS oci_examples (
+        name TEXT PRIMARY KEY REFERENCES oci_types(name),
+        example BLOB
     );
     """)
     return conn, cur
 
 
-def insert_type(cur, name, kind, doc, raw_xml, params):
+def _resolve_qname(elem, value):
     """
-    Inserts or updates a type in the database.
+    Resolves a prefixed QName attribute value against the element's namespaces.
     Args:
-        cur: The database cursor.
-        name: The name of the type.
-        kind: The kind of the type (e.g., complexType, simpleType).
-        doc: Documentation for the type.
-        raw_xml: Raw XML representation of the type.
-        params: Parameters of the type as a list of dictionaries.
-    """
-    cur.execute(
-        "INSERT OR REPLACE INTO oci_types (name, kind) VALUES (?, ?)", (name, kind)
-    )
-    if doc:
-        cur.execute(
-            "INSERT OR REPLACE INTO oci_docs (name, documentation) VALUES (?, ?)",
-            (name, doc),
-        )
-    if raw_xml:
-        cur.execute(
-            "INSERT OR REPLACE INTO oci_raw_schema (name, xml) VALUES (?, ?)",
-            (name, raw_xml),
-        )
-    cur.execute(
-        "INSERT OR REPLACE INTO oci_parameters (name, parameters) VALUES (?, ?)",
-        (name, json.dumps(params)),
+        elem: The element the value was read from.
+        value: The QName value, e.g. "core:OCIRequest" or "xs:string".
+    Returns:
+        The name in {namespace}local form, or the bare local name if it has no namespace.
+    """
+    prefix, _, local = value.rpartition(":")
+    namespace = elem.nsmap.get(prefix or None)
+    return f"{{{namespace}}}{local}" if namespace else local
+
+
+def _schema_elem(type_elem):
+    """
+    Returns the element stored as a type's schema: simple types are represented
+    by their restriction, list or union element, complex types by themselves.
+    """
+    if type_elem.tag == XS_SIMPLE_TYPE:
+        return _first_child(type_elem)
+    return type_elem
+
+
+def _first_child(elem):
+    """Returns the first child element that is not an annotation, or None."""
+    for child in elem.iterchildren(tag=etree.Element):
+        if child.tag != XS_ANNOTATION:
+            return child
+    return None
+
+
+def _type_name(type_elem):
+    """Returns the qualified name of a type element, or None if it is anonymous."""
+    name = type_elem.get("name")
+    if name is None:
+        return None
+    tns, _ = _schema_roots[type_elem.getroottree().getroot()]
+    return f"{{{tns}}}{name}" if tns else name
+
+
+def _element_name(elem):
+    """Returns the name of an xs:element declaration, qualified if its form requires it."""
+    name = elem.get("name")
+    root = elem.getroottree().getroot()
+    tns, qualified = _schema_roots[root]
+    # global declarations are always qualified
+    default_form = "qualified" if qualified or elem.getparent() is root else "unqualified"
+    form = elem.get("form", default_form)
+    if tns and form == "qualified":
+        return f"{{{tns}}}{name}"
+    return name
+
+
+def _has_element_content(type_elem):
+    """Returns True if the type is a complexType with element (not simple) content."""
+    return (
+        type_elem.tag == XS_COMPLEX_TYPE
+        and type_elem.find(XS_SIMPLE_CONTENT) is None
     )
 
 
-def get_documentation(xsd_type):
+def _content_particles(type_elem):
+    """
+    Returns the particles of a complexType's content model. Extensions list the
+    base type's particles first; nested groups are returned as single particles.
+    """
+    for child in type_elem.iterchildren(tag=etree.Element):
+        if child.tag in MODEL_GROUP_TAGS:
+            return _group_particles(child)
+        if child.tag == XS_COMPLEX_CONTENT:
+            derivation = _first_child(child)
+            particles = []
+            if derivation.tag == XS_EXTENSION:
+                base = type_index.get(_resolve_qname(derivation, derivation.get("base")))
+                if base is not None and _has_element_content(base):
+                    if base not in _base_particles:
+                        _base_particles[base] = _content_particles(base)
+                    particles = _base_particles[base]
+            group = _first_child(derivation)
+            if group is not None and group.tag in MODEL_GROUP_TAGS:
+                particles = particles + _group_particles(group)
+            return particles
+    return []
+
+
+def _group_particles(group):
+    """Returns the child particles (elements, nested groups, wildcards) of a model group."""
+    return [
+        child
+        for child in group.iterchildren(tag=etree.Element)
+        if child.tag != XS_ANNOTATION
+    ]
+
+
+def _element_declaration(elem):
+    """
+    Returns the declaration of an xs:element particle: the element itself, or
+    the global element its ref= names (None if that is not in the loaded schemas).
+    """
+    ref = elem.get("ref")
+    if ref is None:
+        return elem
+    return _global_elements.get(_resolve_qname(elem, ref))
+
+
+def _element_type(elem):
+    """
+    Returns (type_name, type_elem) for a local xs:element: the resolved type
+    reference, or None and the anonymous type declared inline.
+    """
+    type_ref = elem.get("type")
+    if type_ref is not None:
+        # the same few type names repeat across thousands of elements
+        type_name = sys.intern(_resolve_qname(elem, type_ref))
+        return type_name, type_index.get(type_name)
+    return None, _first_child(elem)
+
+
+def _type_dependencies(type_elem):
+    """Returns the complex types expanded as children in the type's tree."""
+    if not _has_element_content(type_elem):
+        return []
+    dependencies = []
+    for e in _content_particles(type_elem):
+        decl = _element_declaration(e) if e.tag == XS_ELEMENT else None
+        if decl is not None:
+            child_type = _element_type(decl)[1]
+            if child_type is not None and _has_element_content(child_type):
+                dependencies.append(child_type)
+    return dependencies
+
+
+def _strongly_connected_types(type_elems):
+    """
+    Finds the strongly connected components of the type dependency graph
+    (Tarjan's algorithm, iterative).
+    Args:
+        type_elems: The type elements to start from; anonymous types are reached
+            through the elements that declare them.
+    Returns:
+        A list of components (lists of type elements) in reverse topological
+        order: every type comes after the types it depends on.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for start in type_elems:
+        if start in index:
+            continue
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(_type_dependencies(start)))]
+        while work:
+            node, dependencies = work[-1]
+            for dep in dependencies:
+                if dep not in index:
+                    index[dep] = lowlink[dep] = len(index)
+                    stack.append(dep)
+                    on_stack.add(dep)
+                    work.append((dep, iter(_type_dependencies(dep))))
+                    break
+                if dep in on_stack:
+                    lowlink[node] = min(lowlink[node], index[dep])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while not component or component[-1] is not node:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    components.append(component)
+    return components
+
+
+# types in dependency order, and the cycle each recursive type belongs to;
+# build_type_tree turns references within a cycle into $ref markers
+_type_order: list[etree._Element] = []
+_cycle_groups: dict[etree._Element, int] = {}
+for _group, _component in enumerate(_strongly_connected_types(schema_types.values())):
+    _type_order.extend(_component)
+    if len(_component) > 1 or _component[0] in _type_dependencies(_component[0]):
+        _cycle_groups.update(dict.fromkeys(_component, _group))
+
+
+def get_documentation(type_elem):
     """
     Extracts documentation from the XSD type's annotation.
     Args:
-        xsd_type: The XSD type to extract documentation from.
+        type_elem: The XSD type element to extract documentation from.
     Returns:
         A string containing the documentation, or None if not found.
     """
-    annotation = xsd_type.elem.find("{http://www.w3.org/2001/XMLSchema}annotation")
+    if type_elem in _doc_cache:
+        return _doc_cache[type_elem]
+    doc = None
+    annotation = _schema_elem(type_elem).find(XS_ANNOTATION)
     if annotation is not None:
-        doc_elem = annotation.find("{http://www.w3.org/2001/XMLSchema}documentation")
+        doc_elem = annotation.find(XS + "documentation")
         if doc_elem is not None and doc_elem.text:
-            return doc_elem.text.strip()
-    return None
+            doc = doc_elem.text.strip()
+    _doc_cache[type_elem] = doc
+    return doc
 
 
-def get_raw_schema(xsd_type):
+def get_raw_schema(type_elem):
     """
     Converts the XSD type element to a string representation.
     Args:
-        xsd_type: The XSD type to convert.
+        type_elem: The XSD type element to convert.
     Returns:
         A string containing the raw schema representation.
     """
-    if xsd_type.elem is not None:
-        try:
-            return etree.tostring(xsd_type.elem, pretty_print=True, encoding="unicode")
-        except TypeError:
-            return ET.tostring(xsd_type.elem, encoding="unicode")
-    return None
+    if type_elem not in _raw_cache:
+        elem = _schema_elem(type_elem)
+        _raw_cache[type_elem] = (
+            etree.tostring(elem, encoding="unicode")
+            if elem is not None
+            else None
+        )
+    return _raw_cache[type_elem]
 
 
-def build_type_tree(xsd_type, seen=None):
+def build_type_tree(type_elem):
     """
     Recursively builds a tree structure from the XSD type, capturing its
-    parameters and documentation.
+    parameters and documentation. A child whose named type is in the same
+    dependency cycle as the type being built is emitted as a $ref marker instead
+    of being expanded, so every tree is finite and independent of how it was reached.
     Args:
-        xsd_type: The XSD type to parse.
-        seen: A list to track already processed types to avoid circular references.
+        type_elem: The xs:complexType or xs:simpleType element to parse.
     Returns:
         A dictionary representing the type, its parameters, documentation, and raw schema.
+        Results are memoized, so the returned dictionary may be shared between callers
+        and must not be modified.
     """
-    if seen is None:
-        seen = []
-
-    if xsd_type in seen:
-        return {"type": xsd_type.name, "parameters": [{"$ref": xsd_type.name}]}
-    seen.append(id(xsd_type))
+    if type_elem in _tree_cache:
+        return _tree_cache[type_elem]
 
     params = []
-    if hasattr(xsd_type, "content") and hasattr(xsd_type.content, "__iter__"):
-        for e in xsd_type.content:
-            if not hasattr(e, "type"):
-                continue  # skip non-element content like XsdGroup or XsdChoice
-            child = {"name": e.name}
-            if hasattr(e, "min_occurs"):
-                child["minOccurs"] = e.min_occurs
-            if hasattr(e, "max_occurs"):
-                child["maxOccurs"] = e.max_occurs
-
-            if hasattr(e.type, "content") and hasattr(e.type.content, "__iter__"):
-                child["children"] = build_type_tree(e.type, seen)["parameters"]
+    if _has_element_content(type_elem):
+        group = _cycle_groups.get(type_elem)
+        for e in _content_particles(type_elem):
+            if e.tag != XS_ELEMENT:
+                continue  # skip nested xs:sequence/xs:choice groups and wildcards
+            decl = _element_declaration(e)
+            if decl is None:
+                continue  # ref= to an element outside the loaded schemas
+            get = e.get
+            max_occurs = get("maxOccurs", "1")
+            child = {
+                "name": sys.intern(_element_name(decl)),
+                "minOccurs": int(get("minOccurs", "1")),
+                "maxOccurs": None if max_occurs == "unbounded" else int(max_occurs),
+            }
+
+            child_type_name, child_type = _element_type(decl)
+            if (
+                child_type is not None
+                and child_type.tag == XS_COMPLEX_TYPE
+                and child_type.find(XS_SIMPLE_CONTENT) is None
+            ):
+                # every cycle passes through a named type; anonymous types are
+                # expanded in place and end at a named $ref one level down
+                if (
+                    group is not None
+                    and _cycle_groups.get(child_type) == group
+                    and child_type.get("name") is not None
+                ):
+                    child["children"] = [{"$ref": _type_name(child_type)}]
+                else:
+                    child["children"] = build_type_tree(child_type)["parameters"]
             else:
-                child["type"] = getattr(e.type, "name", str(e.type))
+                child["type"] = child_type_name
             params.append(child)
-    seen.pop()  # remove the current type from seen
-    doc = get_documentation(xsd_type)
-    raw_schema = get_raw_schema(xsd_type)
-    return {
-        "type": xsd_type.name,
-        "documentation": doc,
+    tree = {
+        "type": _type_name(type_elem),
+        "documentation": get_documentation(type_elem),
         "parameters": params,
-        "raw_schema": raw_schema,
+        "raw_schema": get_raw_schema(type_elem),
     }
+    _tree_cache[type_elem] = tree
+    return tree
+
+
+def raw_schema_compressor(samples):
+    """
+    Trains a zstd dictionary on the raw schema snippets. Each snippet is small
+    but they share most of their markup, so compressing them against a common
+    dictionary is roughly three times smaller than compressing them one by one.
+    Args:
+        samples: The encoded raw schema snippets.
+    Returns:
+        A tuple of (compressor, dictionary), where dictionary is the trained
+        dictionary as bytes, or None if there were too few samples to train one.
+    """
+    try:
+        dictionary = zstandard.train_dictionary(RAW_SCHEMA_DICT_SIZE, samples)
+    except zstandard.ZstdError:
+        return zstandard.ZstdCompressor(level=RAW_SCHEMA_LEVEL), None
+    compressor = zstandard.ZstdCompressor(level=RAW_SCHEMA_LEVEL, dict_data=dictionary)
+    return compressor, dictionary.as_bytes()
+
+
+def process_type(name):
+    """
+    Builds the database values for one schema type. Runs in the worker
+    processes, which share (fork) or reload (spawn) the parsed schema.
+    Args:
+        name: The name of the type in schema_types.
+    Returns:
+        A tuple of (name, kind, documentation, raw_xml, parameters, example),
+        with parameters and example already serialized to JSON bytes.
+    """
+    type_elem = schema_types[name]
+    params = build_type_tree(type_elem)["parameters"]
+    return (
+        name,
+        etree.QName(type_elem).localname,
+        get_documentation(type_elem),
+        get_raw_schema(type_elem),
+        orjson.dumps(params),
+        orjson.dumps(walk_parameters(params)),
+    )
 
 
-def build_example(parameters):
+def collect_types(rows, total):
     """
-    Builds an example JSON structure based on the parameters of the XSD type.
+    Collects the rows built by process_type, logging progress as they arrive.
     Args:
-        parameters: The parameters of the XSD type.
+        rows: An iterable of process_type results.
+        total: The number of types being built.
     Returns:
-        A dictionary representing an example structure for the parameters.
+        The rows as a list.
     """
-    print("Building example for parameters:", parameters)
-    example = {}
-    for param in parameters:
-        print("Processing parameter:", param)
-        if "children" in param:
-            example[param["name"]] = build_example(param["children"])
-        else:
-            example[param["name"]] = ""
-    return example
+    results = []
+    for count, row in enumerate(rows, 1):
+        results.append(row)
+        if count % 100 == 0:
+            logger.info("Processed %d of %d types", count, total)
+    return results
 
 
-def main():
-    """main logic to parse the XSD schema and populate the database."""
+def main(max_workers=1):
+    """main logic to parse the XSD schema and populate the database.
+    Args:
+        max_workers: Number of worker processes for building the types, or None
+            for the CPU count. The default builds everything in-process: each
+            worker has to fill its own caches (and under spawn re-parse the
+            schema), which outweighs the parallelism on small machines.
+    """
     conn, cur = initialize_db()
-    for name, xsd_type in schema.types.items():
-        kind = "complexType" if hasattr(xsd_type, "content") else "simpleType"
-        doc = get_documentation(xsd_type)
-        raw_xml = get_raw_schema(xsd_type)
-        params = build_type_tree(xsd_type)["parameters"]
-        insert_type(cur, name, kind, doc, raw_xml, params)
-
-    conn.commit()
+    # dependencies first, so the children of each tree are already memoized
+    names = [
+        elem.get("name")
+        for elem in _type_order
+        if schema_types.get(elem.get("name")) is elem
+    ]
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers) as executor:
+            results = collect_types(
+                executor.map(process_type, names, chunksize=64), len(names)
+            )
+    else:
+        results = collect_types(map(process_type, names), len(names))
+
+    compressor, dictionary = raw_schema_compressor(
+        [r[3].encode() for r in results if r[3]]
+    )
+
+    # one explicit transaction for the whole load, committed on exit; the
+    # database is rebuilt from scratch so no type outlives the schema it came
+    # from (or the dictionary its raw schema was compressed with)
+    with conn:
+        for table in (
+            "oci_examples",
+            "oci_parameters",
+            "oci_raw_schema",
+            "oci_raw_schema_dict",
+            "oci_docs",
+            "oci_types",
+        ):
+            cur.execute(f"DELETE FROM {table}")
+        if dictionary is not None:
+            cur.execute(
+                "INSERT INTO oci_raw_schema_dict (dictionary) VALUES (?)", (dictionary,)
+            )
+        cur.executemany(
+            "INSERT OR REPLACE INTO oci_types (name, kind) VALUES (?, ?)",
+            [(r[0], r[1]) for r in results],
+        )
+        cur.executemany(
+            "INSERT OR REPLACE INTO oci_docs (name, documentation) VALUES (?, ?)",
+            [(r[0], r[2]) for r in results if r[2]],
+        )
+        cur.executemany(
+            "INSERT OR REPLACE INTO oci_raw_schema (name, xml) VALUES (?, ?)",
+            [(r[0], compressor.compress(r[3].encode())) for r in results if r[3]],
+        )
+        cur.executemany(
+            "INSERT OR REPLACE INTO oci_parameters (name, parameters) VALUES (?, ?)",
+            [(r[0], r[4]) for r in results],
+        )
+        cur.executemany(
+            "INSERT OR REPLACE INTO oci_examples (name, example) VALUES (?, ?)",
+            [(r[0], r[5]) for r in results],
+        )
     conn.close()
 
 
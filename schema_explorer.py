@@ -1,8 +1,8 @@
 import argparse
 import re
 from oci.schema import SQLiteOCITypeStore
-import json
 import logging
+import orjson
 from rich.console import Console
 from rich.panel import Panel
 from rich.syntax import Syntax
@@ -29,10 +29,13 @@ def main_menu():
         console.print("[bold red]No pattern provided. Exiting.[/]")
         return
 
-    names = store.types(kind=kind.title() if kind else None)
-    logger.debug("Found %d types in the database.", len(names))
-    logger.debug("Type names: %s", names)
-    options = [name for name in names if re.search(pattern, name, re.IGNORECASE)]
+    try:
+        options = store.types(kind=kind.title() if kind else None, regex=pattern)
+    except re.error as err:
+        console.print(f"[bold red]Invalid pattern: {err}. Exiting.[/]")
+        return
+    logger.debug("Found %d matching types in the database.", len(options))
+    logger.debug("Type names: %s", options)
 
     if not options:
         console.print("[bold yellow]No types found.[/]")
@@ -47,24 +50,21 @@ def main_menu():
     selected_type = options[0]
     console.print(Panel(f"[#ffcc00]{selected_type}[/]", title="Selected Type"))
 
-    doc = store.doc(selected_type)
+    doc, schema, params, example = store.get_all(selected_type)
     if doc:
         console.print(Panel(f"[#c8e1ff]{doc.strip()}[/]", title="Documentation"))
 
-    schema = store.schema(selected_type)
     if schema:
         xsd_syntax = Syntax(schema.strip(), "xml", theme="github-dark", word_wrap=True)
         console.print(Panel(xsd_syntax, title="Formatted Schema", subtitle="XSD"))
         # console.print(Panel(schema.strip(), title="Raw Schema", subtitle="XML"))
 
-    params = store.parameters(selected_type)
     if params:
-        json_syntax = Syntax(json.dumps(params, indent=2), "json", theme="github-dark", word_wrap=True)
+        json_syntax = Syntax(orjson.dumps(params, option=orjson.OPT_INDENT_2).decode(), "json", theme="github-dark", word_wrap=True)
         console.print(Panel(json_syntax, title="Parameters"))
 
-    example = store.example(selected_type)
     if example:
-        example_syntax = Syntax(json.dumps(example, indent=2), "json", theme="github-dark", word_wrap=True)
+        example_syntax = Syntax(orjson.dumps(example, option=orjson.OPT_INDENT_2).decode(), "json", theme="github-dark", word_wrap=True)
         console.print(Panel(example_syntax, title="Example"))
 
 if __name__ == "__main__":